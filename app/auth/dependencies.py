@@ -1,65 +1,186 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from cachetools import TTLCache
+from dataclasses import dataclass
+from datetime import datetime
+from threading import Lock
+from typing import List, Optional
+import time
 
 from app.auth.security import decode_token
+from app.cache import get_cached_user, cache_user
+from app.config import settings
 from app.database import get_db
 from app.models.database_models import User
-from app.models.schemas import UserRole, PermissionName
+from app.models.schemas import UserRole, PermissionName, permission_mask
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# Per-process memoization of resolved access tokens. Tokens are immutable
+# and short-lived, so serving the same snapshot for up to 60s skips both
+# JWT verification and the Redis/DB lookup on repeated calls.
+_TOKEN_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+# Tokens revoked by logout; entries outlive the longest possible access token
+_REVOKED_TOKENS: TTLCache = TTLCache(
+    maxsize=10_000, ttl=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+)
+_token_cache_lock = Lock()
+# Don't bother caching tokens that are about to expire
+_MIN_TOKEN_CACHE_TTL = 5
+
+def revoke_token_cache(token: str):
+    """Tombstone an access token so it is never served from the cache again"""
+    with _token_cache_lock:
+        _REVOKED_TOKENS[token] = True
+        _TOKEN_CACHE.pop(token, None)
+
+@dataclass
+class AuthenticatedUser:
+    """Lightweight snapshot of a user for request authorization.
+
+    Built either from the database or from the Redis cache, so routes
+    that only read identity/role/permissions never need the ORM object.
+    """
+    id: int
+    email: str
+    name: str
+    phone: Optional[str]
+    role: UserRole
+    is_active: bool
+    is_email_verified: bool
+    created_at: Optional[datetime]
+    last_login: Optional[datetime]
+    permissions: List[str]
+
+    @classmethod
+    def from_orm_user(cls, user: User) -> "AuthenticatedUser":
+        return cls(
+            id=user.id,
+            email=user.email,
+            name=user.name,
+            phone=user.phone,
+            role=user.role,
+            is_active=user.is_active,
+            is_email_verified=user.is_email_verified,
+            created_at=user.created_at,
+            last_login=user.last_login,
+            permissions=[p.name for p in user.permissions]
+        )
+
+    @classmethod
+    def from_cache(cls, data: dict) -> "AuthenticatedUser":
+        return cls(
+            id=data["id"],
+            email=data["email"],
+            name=data["name"],
+            phone=data["phone"],
+            role=UserRole(data["role"]),
+            is_active=data["is_active"],
+            is_email_verified=data["is_email_verified"],
+            created_at=datetime.fromisoformat(data["created_at"]) if data["created_at"] else None,
+            last_login=datetime.fromisoformat(data["last_login"]) if data["last_login"] else None,
+            permissions=data["permissions"]
+        )
+
+    def to_cache(self) -> dict:
+        return {
+            "id": self.id,
+            "email": self.email,
+            "name": self.name,
+            "phone": self.phone,
+            "role": self.role.value if isinstance(self.role, UserRole) else self.role,
+            "is_active": self.is_active,
+            "is_email_verified": self.is_email_verified,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "last_login": self.last_login.isoformat() if self.last_login else None,
+            "permissions": self.permissions
+        }
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
+    db: AsyncSession = Depends(get_db)
+) -> AuthenticatedUser:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+    with _token_cache_lock:
+        revoked = token in _REVOKED_TOKENS
+        entry = None if revoked else _TOKEN_CACHE.get(token)
+
+    if entry is not None:
+        memoized_user, exp = entry
+        if exp > time.time():
+            return memoized_user
+
     payload = decode_token(token)
     if payload is None or payload.get("type") != "access":
         raise credentials_exception
-    
+
     email: str = payload.get("sub")
     if email is None:
         raise credentials_exception
-    
-    user = db.query(User).filter(User.email == email).first()
-    
-    if user is None:
-        raise credentials_exception
-    
-    if not user.is_active:
+
+    cached = await get_cached_user(email)
+    if cached is not None:
+        current_user = AuthenticatedUser.from_cache(cached)
+    else:
+        # selectinload keeps this at one extra query; without it, reading
+        # user.permissions (e.g. for /me) lazy-loads per request — and
+        # raises under AsyncSession
+        result = await db.execute(
+            select(User).options(
+                selectinload(User.permissions)
+            ).where(User.email == email)
+        )
+        user = result.scalar_one_or_none()
+
+        if user is None:
+            raise credentials_exception
+
+        current_user = AuthenticatedUser.from_orm_user(user)
+        await cache_user(email, current_user.to_cache())
+
+    if not current_user.is_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="User account is disabled"
         )
-    
-    return user
+
+    exp = payload.get("exp")
+    if exp and not revoked and exp - time.time() >= _MIN_TOKEN_CACHE_TTL:
+        with _token_cache_lock:
+            _TOKEN_CACHE[token] = (current_user, exp)
+
+    return current_user
 
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: AuthenticatedUser = Depends(get_current_user)
+) -> AuthenticatedUser:
     # For development, we'll allow unverified users to access the API
     # In production, uncomment the email verification check below
-    
+
     # if not current_user.is_email_verified:
     #     raise HTTPException(
     #         status_code=status.HTTP_403_FORBIDDEN,
     #         detail="Please verify your email first"
     #     )
-    
+
     return current_user
 
 def require_role(allowed_roles: List[UserRole]):
+    # Built once per route at import time, not per request
+    allowed = frozenset(allowed_roles)
+
     async def role_checker(
-        current_user: User = Depends(get_current_active_user)
-    ) -> User:
-        if current_user.role not in allowed_roles:
+        current_user: AuthenticatedUser = Depends(get_current_active_user)
+    ) -> AuthenticatedUser:
+        if current_user.role not in allowed:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"User role '{current_user.role}' is not authorized for this action"
@@ -68,13 +189,22 @@ def require_role(allowed_roles: List[UserRole]):
     return role_checker
 
 def require_permission(required_permissions: List[str]):
+    required_mask = permission_mask(required_permissions)
+    required = frozenset(required_permissions)
+
     async def permission_checker(
-        current_user: User = Depends(get_current_active_user)
-    ) -> User:
-        user_permissions = [p.name for p in current_user.permissions]
-        has_permission = any(
-            perm in user_permissions for perm in required_permissions
-        )
+        token: str = Depends(oauth2_scheme),
+        current_user: AuthenticatedUser = Depends(get_current_active_user)
+    ) -> AuthenticatedUser:
+        payload = decode_token(token)
+        perms_claim = payload.get("perms") if payload else None
+
+        if perms_claim is not None:
+            # Tokens carry the permissions bitmap, so the check is one AND
+            has_permission = bool(perms_claim & required_mask)
+        else:
+            # Tokens issued before the perms claim: fall back to the snapshot
+            has_permission = not required.isdisjoint(current_user.permissions)
         if not has_permission:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -0,0 +1,59 @@
+from sqlalchemy import select
+from typing import Dict, List
+import logging
+
+from app.database import AsyncSessionLocal
+from app.models.database_models import Permission
+from app.models.schemas import UserRole
+
+logger = logging.getLogger(__name__)
+
+# Seed data for the permissions table
+DEFAULT_PERMISSIONS = [
+    {"name": "read", "description": "Can read data"},
+    {"name": "write", "description": "Can write data"},
+    {"name": "delete", "description": "Can delete data"},
+    {"name": "manage_users", "description": "Can manage users"},
+    {"name": "manage_roles", "description": "Can manage roles"}
+]
+
+# Default permission names granted per role
+ROLE_PERMISSION_NAMES = {
+    UserRole.ADMIN: [perm["name"] for perm in DEFAULT_PERMISSIONS],
+    UserRole.HR: ["read", "write", "manage_users"],
+    UserRole.USER: ["read"],
+    UserRole.CANDIDATE: ["read"],
+}
+
+# {name: id} for the seeded permissions, populated at startup so signup
+# never has to probe the permissions table row by row
+permission_ids: Dict[str, int] = {}
+
+async def ensure_default_permissions():
+    """Seed missing default permissions and cache their ids.
+
+    Runs once from lifespan startup (signup used to do this on every
+    request). Failures are logged, not raised: the cache refills lazily
+    on the next signup once the database is reachable.
+    """
+    try:
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(select(Permission))).scalars().all()
+            existing = {p.name: p.id for p in rows}
+
+            missing = [p for p in DEFAULT_PERMISSIONS if p["name"] not in existing]
+            if missing:
+                db.add_all([Permission(**perm) for perm in missing])
+                await db.commit()
+                rows = (await db.execute(select(Permission))).scalars().all()
+                existing = {p.name: p.id for p in rows}
+
+            permission_ids.clear()
+            permission_ids.update(existing)
+    except Exception as e:
+        logger.warning(f"Could not initialize default permissions: {e}")
+
+def role_permission_ids(role: UserRole) -> List[int]:
+    """Default permission ids for a role, from the startup cache"""
+    names = ROLE_PERMISSION_NAMES.get(role, ["read"])
+    return [permission_ids[name] for name in names if name in permission_ids]
@@ -1,13 +1,25 @@
 from datetime import datetime, timedelta
 from typing import Optional
+from anyio import to_thread
+from cachetools import TTLCache
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from threading import Lock
 import secrets
 import hashlib
+import time
 
 from app.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Argon2id for new hashes; bcrypt stays in the context (marked deprecated)
+# so hashes from existing accounts still verify
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated=["bcrypt"],
+    argon2__time_cost=3,
+    argon2__memory_cost=65536,
+    argon2__parallelism=1,
+)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -15,6 +27,14 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    """verify_password in a worker thread so bcrypt doesn't block the event loop"""
+    return await to_thread.run_sync(verify_password, plain_password, hashed_password)
+
+async def aget_password_hash(password: str) -> str:
+    """get_password_hash in a worker thread so bcrypt doesn't block the event loop"""
+    return await to_thread.run_sync(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -29,19 +49,44 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 def create_refresh_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire, "type": "refresh"})
+    # jti makes each token unique: without it, two tokens for the same user
+    # in the same second are byte-identical and collide on the unique
+    # refresh_token_hash index
+    to_encode.update({"exp": expire, "type": "refresh", "jti": secrets.token_hex(8)})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
+# Memoized signature checks: a token's payload never changes, so repeated
+# decodes of the same bearer token only verify the HMAC once. Expiry is
+# still enforced on every hit; failures are never cached.
+_DECODE_CACHE: TTLCache = TTLCache(maxsize=8192, ttl=300)
+_decode_cache_lock = Lock()
+
 def decode_token(token: str):
+    with _decode_cache_lock:
+        payload = _DECODE_CACHE.get(token)
+    if payload is not None:
+        exp = payload.get("exp")
+        if exp is not None and exp <= time.time():
+            return None
+        return payload
+
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return payload
     except JWTError:
         return None
+    with _decode_cache_lock:
+        _DECODE_CACHE[token] = payload
+    return payload
 
 def generate_verification_token():
     return secrets.token_urlsafe(32)
 
+# Base context copied per call instead of constructing a fresh OpenSSL
+# digest object each time; for short token inputs setup dominates
+_TOKEN_HASH_BASE = hashlib.sha256()
+
 def hash_token(token: str):
-    return hashlib.sha256(token.encode()).hexdigest()
+    h = _TOKEN_HASH_BASE.copy()
+    h.update(token.encode())
+    return h.hexdigest()
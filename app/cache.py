@@ -0,0 +1,68 @@
+import json
+import logging
+from typing import Optional
+
+import redis.asyncio as aioredis
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# How long a cached user snapshot stays valid (seconds)
+USER_CACHE_TTL = 300
+
+_redis_client: Optional[aioredis.Redis] = None
+
+def get_redis() -> Optional[aioredis.Redis]:
+    """Return the shared Redis client, or None when caching is not configured"""
+    global _redis_client
+
+    if not settings.REDIS_URL:
+        return None
+
+    if _redis_client is None:
+        _redis_client = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+
+    return _redis_client
+
+def _user_key(email: str) -> str:
+    return f"user:{email}"
+
+async def get_cached_user(email: str) -> Optional[dict]:
+    """Fetch a cached user snapshot, returning None on miss or Redis failure"""
+    client = get_redis()
+    if client is None:
+        return None
+
+    try:
+        raw = await client.get(_user_key(email))
+    except Exception as e:
+        logger.warning(f"Redis unavailable, falling back to database: {e}")
+        return None
+
+    if raw is None:
+        return None
+
+    return json.loads(raw)
+
+async def cache_user(email: str, data: dict):
+    """Store a user snapshot with a short TTL; failures are non-fatal"""
+    client = get_redis()
+    if client is None:
+        return
+
+    try:
+        await client.setex(_user_key(email), USER_CACHE_TTL, json.dumps(data))
+    except Exception as e:
+        logger.warning(f"Could not cache user {email}: {e}")
+
+async def invalidate_user_cache(email: str):
+    """Drop the cached snapshot after a role/permission/status change"""
+    client = get_redis()
+    if client is None:
+        return
+
+    try:
+        await client.delete(_user_key(email))
+    except Exception as e:
+        logger.warning(f"Could not invalidate cache for {email}: {e}")
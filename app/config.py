@@ -15,9 +15,22 @@ class Settings(BaseSettings):
     MYSQL_USER: str = "root"
     MYSQL_PASSWORD: str = "Khan@123"
     MYSQL_DATABASE: str = "auth_database"
-    
+
+    # Connection pool (keep pool_recycle below MySQL's wait_timeout so the
+    # pool drops connections before the server kills them)
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 40
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_TIMEOUT: int = 5
+
+    # Create tables at startup (development convenience; leave off when the
+    # schema is managed with database_setup.sql or migrations)
+    AUTO_CREATE_TABLES: bool = False
+
     # Firebase
     FIREBASE_CREDENTIALS_PATH: Optional[str] = "./firebase-credentials.json"
+    # Web API key used only to warm the token-verification cache at startup
+    FIREBASE_WEB_API_KEY: Optional[str] = None
     
     # Email
     MAIL_USERNAME: str = "your-email@gmail.com"
@@ -39,6 +52,12 @@ class Settings(BaseSettings):
         # URL encode the password to handle special characters like @ in Khan@123
         encoded_password = quote_plus(self.MYSQL_PASSWORD)
         return f"mysql+pymysql://{self.MYSQL_USER}:{encoded_password}@{self.MYSQL_HOST}:{self.MYSQL_PORT}/{self.MYSQL_DATABASE}"
+
+    @property
+    def ASYNC_DATABASE_URL(self) -> str:
+        # Same database, but through the non-blocking asyncmy driver
+        encoded_password = quote_plus(self.MYSQL_PASSWORD)
+        return f"mysql+asyncmy://{self.MYSQL_USER}:{encoded_password}@{self.MYSQL_HOST}:{self.MYSQL_PORT}/{self.MYSQL_DATABASE}"
     
     class Config:
         env_file = ".env"
@@ -2,6 +2,7 @@ import firebase_admin
 from firebase_admin import credentials, auth as firebase_auth
 from typing import Optional
 import logging
+import requests
 
 from app.config import settings
 
@@ -9,6 +10,8 @@ logger = logging.getLogger(__name__)
 
 firebase_app: Optional[firebase_admin.App] = None
 
+_IDENTITY_TOOLKIT_URL = "https://identitytoolkit.googleapis.com/v1/accounts:signInWithCustomToken"
+
 def initialize_firebase():
     global firebase_app
     
@@ -23,6 +26,35 @@ def initialize_firebase():
     else:
         logger.warning("Firebase credentials not provided")
 
+def warm_token_verification():
+    """Warm the SDK's public-key cache so the first real verify_id_token
+    call doesn't pay the multi-second key download.
+
+    Mints a custom token for a synthetic UID, exchanges it for an ID token
+    via the Identity Toolkit REST API, and verifies it once. Failures only
+    mean the first real login is slower, so they never block startup.
+    """
+    if not firebase_app:
+        return
+
+    if not settings.FIREBASE_WEB_API_KEY:
+        logger.info("FIREBASE_WEB_API_KEY not set, skipping Firebase warmup")
+        return
+
+    try:
+        custom_token = firebase_auth.create_custom_token("startup-warmup")
+        response = requests.post(
+            _IDENTITY_TOOLKIT_URL,
+            params={"key": settings.FIREBASE_WEB_API_KEY},
+            json={"token": custom_token.decode(), "returnSecureToken": True},
+            timeout=10
+        )
+        response.raise_for_status()
+        firebase_auth.verify_id_token(response.json()["idToken"])
+        logger.info("Firebase token verification warmed up")
+    except Exception as e:
+        logger.warning(f"Firebase warmup failed (first verification will be slower): {e}")
+
 def verify_firebase_token(id_token: str):
     if not firebase_app:
         raise Exception("Firebase is not initialized")
@@ -1,6 +1,9 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
+import asyncio
+import logging
 import uvicorn
 import sys
 import os
@@ -11,21 +14,35 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app.config import settings
 from app.database import engine, Base
 from app.routers import auth, users, admin
-from app.firebase_config import initialize_firebase
+from app.routers.admin import warm_permission_cache
+from app.auth.permissions import ensure_default_permissions
+from app.firebase_config import initialize_firebase, warm_token_verification
 
-# Create tables (with error handling)
-try:
-    Base.metadata.create_all(bind=engine)
-    print("✅ Database tables created successfully")
-except Exception as e:
-    print(f"⚠️  Warning: Could not connect to database: {e}")
-    print("💡 Make sure MySQL is running and the database 'auth_database' exists")
-    print("🔧 You can still start the API server, but database operations will fail")
+logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    # Create tables off the event loop; disabled by default in deployments
+    # where the schema is managed externally (database_setup.sql/migrations)
+    if settings.AUTO_CREATE_TABLES:
+        try:
+            await asyncio.to_thread(Base.metadata.create_all, engine)
+            logger.info("Database tables created successfully")
+        except Exception:
+            logger.warning(
+                "Could not connect to database; the API will start but "
+                "database operations will fail. Make sure MySQL is running "
+                "and the 'auth_database' database exists.", exc_info=True
+            )
     initialize_firebase()
+    # Pre-fetch Google's public keys off the event loop so the first
+    # firebase-login request doesn't stall on the key download
+    await asyncio.to_thread(warm_token_verification)
+    # Seed default permissions once, instead of probing on every signup
+    await ensure_default_permissions()
+    # Pre-load the role/permission tables used by the admin routes
+    await warm_permission_cache()
     yield
     # Shutdown
     pass
@@ -34,20 +51,21 @@ app = FastAPI(
     title="Authentication API",
     description="Backend API with MySQL, Firebase integration and role-based access",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
-# CORS configuration
+# CORS configuration: a fixed origin list plus one precompiled regex for
+# tunnels. "*" is invalid alongside allow_credentials=True anyway, and the
+# wildcard entries were never matched as patterns by the middleware.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
         "http://localhost:3000",
-        "http://localhost:3001", 
+        "http://localhost:3001",
         "http://127.0.0.1:3000",
-        "https://*.ngrok.io",  # Allow ngrok tunnels
-        "https://*.trycloudflare.com",  # Allow Cloudflare tunnels
-        "*"  # Allow all origins for development (remove in production)
     ],
+    allow_origin_regex=r"^https://[a-z0-9-]+\.(ngrok\.io|trycloudflare\.com)$",
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -63,4 +81,13 @@ async def root():
     return {"message": "Authentication API with MySQL is running"}
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
+    # C-level event loop and HTTP parser; use run.py for the reload server
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=os.cpu_count(),
+        reload=False
+    )
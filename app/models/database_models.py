@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Enum as SQLEnum, JSON, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Enum as SQLEnum, JSON, ForeignKey, Index, Table, func, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -9,8 +9,8 @@ from app.database import Base
 user_permissions = Table(
     'user_permissions',
     Base.metadata,
-    Column('user_id', Integer, ForeignKey('users.id')),
-    Column('permission_id', Integer, ForeignKey('permissions.id'))
+    Column('user_id', Integer, ForeignKey('users.id', ondelete="CASCADE")),
+    Column('permission_id', Integer, ForeignKey('permissions.id', ondelete="CASCADE"))
 )
 
 class UserRole(str, enum.Enum):
@@ -21,7 +21,18 @@ class UserRole(str, enum.Enum):
 
 class User(Base):
     __tablename__ = "users"
-    
+    # Covering indexes for the dashboard stats filters, so the counts are
+    # index-range scans instead of full table scans
+    __table_args__ = (
+        Index("ix_users_role", "role"),
+        Index("ix_users_active_verified", "is_active", "is_email_verified"),
+        Index("ix_users_created_at", "created_at"),
+        # verify-email and reset-password prefilter on a short token prefix;
+        # the full hash is compared in Python with hmac.compare_digest
+        Index("ix_users_email_verification_token_prefix", "email_verification_token_prefix"),
+        Index("ix_users_reset_password_token_prefix", "reset_password_token_prefix"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String(255), unique=True, index=True, nullable=False)
     name = Column(String(255), nullable=False)
@@ -32,22 +43,36 @@ class User(Base):
     is_email_verified = Column(Boolean, default=False)
     firebase_uid = Column(String(255), unique=True, nullable=True, index=True)
     
-    # Timestamps
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Timestamps, maintained by MySQL so writes don't have to send them
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(
+        DateTime,
+        server_default=text("CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
+        server_onupdate=func.now()
+    )
     last_login = Column(DateTime, nullable=True)
     
-    # Email verification
+    # Email verification; the prefix is the indexed lookup key, the full
+    # hash is only compared in Python
     email_verification_token = Column(String(255), nullable=True)
+    email_verification_token_prefix = Column(String(16), nullable=True)
     email_verification_expire = Column(DateTime, nullable=True)
     
     # Password reset
     reset_password_token = Column(String(255), nullable=True)
+    reset_password_token_prefix = Column(String(16), nullable=True)
     reset_password_expire = Column(DateTime, nullable=True)
     
-    # Relationships
-    permissions = relationship("Permission", secondary=user_permissions, back_populates="users")
-    sessions = relationship("UserSession", back_populates="user", cascade="all, delete-orphan")
+    # Relationships; passive_deletes defers cleanup to the DB-level
+    # ON DELETE CASCADE so deleting a user never loads these collections
+    permissions = relationship(
+        "Permission", secondary=user_permissions,
+        back_populates="users", passive_deletes=True
+    )
+    sessions = relationship(
+        "UserSession", back_populates="user",
+        cascade="all, delete-orphan", passive_deletes=True
+    )
 
 class Permission(Base):
     __tablename__ = "permissions"
@@ -61,12 +86,18 @@ class Permission(Base):
 
 class UserSession(Base):
     __tablename__ = "user_sessions"
-    
+    # /refresh filters on user_id + expires_at
+    __table_args__ = (
+        Index("ix_sessions_user_expires", "user_id", "expires_at"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    refresh_token = Column(Text, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # SHA-256 of the refresh token: fixed-width, uniquely indexable, and a
+    # leaked sessions table no longer yields usable tokens
+    refresh_token_hash = Column(String(64), unique=True, index=True, nullable=False)
     expires_at = Column(DateTime, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
     ip_address = Column(String(45), nullable=True)
     user_agent = Column(String(255), nullable=True)
     
@@ -2,6 +2,10 @@ from pydantic import BaseModel, EmailStr, Field, validator
 from typing import Optional, List
 from datetime import datetime
 from enum import Enum
+import re
+
+# Compiled once: at least 6 chars with a digit and an uppercase letter
+_PASSWORD_RE = re.compile(r"^(?=.*\d)(?=.*[A-Z]).{6,}$", re.DOTALL)
 
 class UserRole(str, Enum):
     USER = "user"
@@ -16,6 +20,23 @@ class PermissionName(str, Enum):
     MANAGE_USERS = "manage_users"
     MANAGE_ROLES = "manage_roles"
 
+# Stable bit per permission, used to pack a user's permissions into the
+# "perms" JWT claim so authorization checks reduce to one bitwise AND
+PERMISSION_BITS = {
+    PermissionName.READ.value: 1,
+    PermissionName.WRITE.value: 2,
+    PermissionName.DELETE.value: 4,
+    PermissionName.MANAGE_USERS.value: 8,
+    PermissionName.MANAGE_ROLES.value: 16,
+}
+
+def permission_mask(permission_names) -> int:
+    """Pack an iterable of permission names into a single integer bitmap"""
+    mask = 0
+    for name in permission_names:
+        mask |= PERMISSION_BITS.get(name, 0)
+    return mask
+
 class UserBase(BaseModel):
     email: EmailStr
     name: str
@@ -27,12 +48,11 @@ class UserCreate(UserBase):
     
     @validator('password')
     def validate_password(cls, v):
-        if len(v) < 6:
-            raise ValueError('Password must be at least 6 characters long')
-        if not any(char.isdigit() for char in v):
-            raise ValueError('Password must contain at least one digit')
-        if not any(char.isupper() for char in v):
-            raise ValueError('Password must contain at least one uppercase letter')
+        if not _PASSWORD_RE.match(v):
+            raise ValueError(
+                'Password must be at least 6 characters long and contain '
+                'at least one digit and one uppercase letter'
+            )
         return v
 
 class UserLogin(BaseModel):
@@ -46,7 +66,13 @@ class UserResponse(UserBase):
     created_at: datetime
     last_login: Optional[datetime]
     permissions: List[str] = []
-    
+
+    @validator('permissions', pre=True)
+    def permission_names(cls, v):
+        # Accept ORM Permission objects as well as plain names, so the
+        # model can be validated straight from a User row
+        return [getattr(p, 'name', p) for p in v]
+
     class Config:
         from_attributes = True
 
@@ -1,24 +1,117 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from cachetools import TTLCache
+from collections import defaultdict
+from typing import Dict, List
 from datetime import datetime, timedelta
+import logging
 
-from app.database import get_db
-from app.models.database_models import User, Permission
+from app.cache import invalidate_user_cache
+from app.database import AsyncSessionLocal, get_db
+from app.models.database_models import User, Permission, user_permissions
 from app.models.schemas import UserResponse, UserRole, PermissionResponse
-from app.auth.dependencies import require_role, require_permission
+from app.auth.dependencies import AuthenticatedUser, require_role, require_permission
+from app.auth.permissions import ROLE_PERMISSION_NAMES
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# The permissions table is ~immutable seed data, so keep the full
+# {name: Permission} map in-process and refresh it every five minutes
+_PERMISSION_CACHE: TTLCache = TTLCache(maxsize=1, ttl=300)
+
+# Bumped on permission writes; drives the ETag on GET /permissions so
+# polling dashboards can short-circuit with 304s
+_PERMISSIONS_VERSION = 1
+
+async def _all_permissions(db: AsyncSession) -> Dict[str, Permission]:
+    """Return all permissions keyed by name, served from the TTL cache"""
+    permissions = _PERMISSION_CACHE.get("permissions")
+    if permissions is None:
+        rows = (await db.execute(select(Permission))).scalars().all()
+        permissions = {p.name: p for p in rows}
+        _PERMISSION_CACHE["permissions"] = permissions
+    return permissions
+
+async def _permission_ids_for(db: AsyncSession, names: List[str]) -> List[int]:
+    """Resolve permission names to ids via the cached permission map.
+
+    Deduplicates (order-preserving): repeated names in a request body
+    must not become duplicate association rows in the bulk insert.
+    """
+    permissions = await _all_permissions(db)
+    return [permissions[name].id for name in dict.fromkeys(names) if name in permissions]
+
+async def _replace_user_permissions(db: AsyncSession, user_id: int, names: List[str]):
+    """Rewrite a user's permission assignments directly in the association
+    table, without loading the old collection through the ORM"""
+    permission_ids = await _permission_ids_for(db, names)
+    await db.execute(
+        delete(user_permissions).where(user_permissions.c.user_id == user_id)
+    )
+    if permission_ids:
+        await db.execute(
+            insert(user_permissions),
+            [{"user_id": user_id, "permission_id": pid} for pid in permission_ids]
+        )
+
+async def _role_permission_names(db: AsyncSession, role: UserRole) -> List[str]:
+    """Default permission names for a role, from the shared role policy.
+
+    ADMIN reads the cached table instead, so custom permissions added
+    beyond the seed set are included.
+    """
+    if role == UserRole.ADMIN:
+        return list(await _all_permissions(db))
+    return ROLE_PERMISSION_NAMES.get(role, ["read"])
+
+async def warm_permission_cache():
+    """Populate the permission cache at startup so the first admin write
+    doesn't pay the initial SELECT"""
+    try:
+        async with AsyncSessionLocal() as db:
+            await _all_permissions(db)
+    except Exception as e:
+        # The cache refills lazily, so a cold database at boot is harmless
+        logger.warning(f"Could not warm permission cache: {e}")
+
+async def _user_email_or_404(db: AsyncSession, user_id: int) -> str:
+    """Cheap existence check that also yields the email for cache invalidation"""
+    email = (await db.execute(
+        select(User.email).where(User.id == user_id)
+    )).scalar_one_or_none()
+    if email is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    return email
+
 @router.get("/users", response_model=List[UserResponse])
 async def get_all_users(
     skip: int = 0,
     limit: int = 100,
-    current_user: User = Depends(require_role([UserRole.ADMIN, UserRole.HR])),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(require_role([UserRole.ADMIN, UserRole.HR])),
+    db: AsyncSession = Depends(get_db)
 ):
-    users = db.query(User).offset(skip).limit(limit).all()
-    
+    result = await db.execute(select(User).offset(skip).limit(limit))
+    users = result.scalars().all()
+
+    # Project permission names with one core query instead of materializing
+    # Permission objects per user through the relationship
+    perm_map = defaultdict(list)
+    if users:
+        rows = (await db.execute(
+            select(user_permissions.c.user_id, Permission.name)
+            .join(Permission, Permission.id == user_permissions.c.permission_id)
+            .where(user_permissions.c.user_id.in_([user.id for user in users]))
+        )).all()
+        for user_id, name in rows:
+            perm_map[user_id].append(name)
+
     return [
         UserResponse(
             id=user.id,
@@ -26,7 +119,7 @@ async def get_all_users(
             name=user.name,
             phone=user.phone,
             role=user.role,
-            permissions=[p.name for p in user.permissions],
+            permissions=perm_map[user.id],
             is_active=user.is_active,
             is_email_verified=user.is_email_verified,
             created_at=user.created_at,
@@ -38,118 +131,94 @@ async def get_all_users(
 @router.get("/users/{user_id}", response_model=UserResponse)
 async def get_user(
     user_id: int,
-    current_user: User = Depends(require_role([UserRole.ADMIN, UserRole.HR])),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(require_role([UserRole.ADMIN, UserRole.HR])),
+    db: AsyncSession = Depends(get_db)
 ):
-    user = db.query(User).filter(User.id == user_id).first()
-    
+    result = await db.execute(
+        select(User).options(
+            selectinload(User.permissions)
+        ).where(User.id == user_id)
+    )
+    user = result.scalar_one_or_none()
+
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
-    
-    return UserResponse(
-        id=user.id,
-        email=user.email,
-        name=user.name,
-        phone=user.phone,
-        role=user.role,
-        permissions=[p.name for p in user.permissions],
-        is_active=user.is_active,
-        is_email_verified=user.is_email_verified,
-        created_at=user.created_at,
-        last_login=user.last_login
-    )
+
+    return UserResponse.model_validate(user)
 
 @router.put("/users/{user_id}/role")
 async def update_user_role(
     user_id: int,
     role: UserRole,
-    current_user: User = Depends(require_permission(["manage_roles"])),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(require_permission(["manage_roles"])),
+    db: AsyncSession = Depends(get_db)
 ):
-    user = db.query(User).filter(User.id == user_id).first()
-    
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-    
-    user.role = role
-    user.updated_at = datetime.utcnow()
-    
+    user_email = await _user_email_or_404(db, user_id)
+
+    await db.execute(
+        update(User).where(User.id == user_id).values(role=role)
+    )
+
     # Update permissions based on new role
-    if role == UserRole.ADMIN:
-        permissions = db.query(Permission).all()
-        user.permissions = permissions
-    elif role == UserRole.HR:
-        permissions = db.query(Permission).filter(
-            Permission.name.in_(["read", "write", "manage_users"])
-        ).all()
-        user.permissions = permissions
-    else:
-        permission = db.query(Permission).filter(Permission.name == "read").first()
-        user.permissions = [permission] if permission else []
-    
-    db.commit()
-    
+    permission_names = await _role_permission_names(db, role)
+    await _replace_user_permissions(db, user_id, permission_names)
+
+    await db.commit()
+
+    await invalidate_user_cache(user_email)
+
     return {"message": f"User role updated to {role}"}
 
 @router.put("/users/{user_id}/permissions")
 async def update_user_permissions(
     user_id: int,
     permission_names: List[str],
-    current_user: User = Depends(require_permission(["manage_users"])),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(require_permission(["manage_users"])),
+    db: AsyncSession = Depends(get_db)
 ):
-    user = db.query(User).filter(User.id == user_id).first()
-    
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-    
-    # Get permissions
-    permissions = db.query(Permission).filter(
-        Permission.name.in_(permission_names)
-    ).all()
-    
-    user.permissions = permissions
-    user.updated_at = datetime.utcnow()
-    db.commit()
-    
+    global _PERMISSIONS_VERSION
+
+    user_email = await _user_email_or_404(db, user_id)
+
+    await _replace_user_permissions(db, user_id, permission_names)
+    # Touch updated_at server-side; assignment changes live in another table
+    await db.execute(
+        update(User).where(User.id == user_id).values(updated_at=func.now())
+    )
+    await db.commit()
+    _PERMISSIONS_VERSION += 1
+
+    await invalidate_user_cache(user_email)
+
     return {"message": "User permissions updated"}
 
 @router.put("/users/{user_id}/status")
 async def toggle_user_status(
     user_id: int,
     is_active: bool,
-    current_user: User = Depends(require_role([UserRole.ADMIN])),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(require_role([UserRole.ADMIN])),
+    db: AsyncSession = Depends(get_db)
 ):
-    user = db.query(User).filter(User.id == user_id).first()
-    
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-    
-    user.is_active = is_active
-    user.updated_at = datetime.utcnow()
-    db.commit()
-    
+    user_email = await _user_email_or_404(db, user_id)
+
+    await db.execute(
+        update(User).where(User.id == user_id).values(is_active=is_active)
+    )
+    await db.commit()
+
+    await invalidate_user_cache(user_email)
+
     status_text = "activated" if is_active else "deactivated"
     return {"message": f"User {status_text} successfully"}
 
 @router.delete("/users/{user_id}")
 async def delete_user(
     user_id: int,
-    current_user: User = Depends(require_permission(["delete"])),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(require_permission(["delete"])),
+    db: AsyncSession = Depends(get_db)
 ):
     # Prevent self-deletion
     if current_user.id == user_id:
@@ -157,44 +226,45 @@ async def delete_user(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Cannot delete your own account"
         )
-    
-    user = db.query(User).filter(User.id == user_id).first()
-    
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-    
-    db.delete(user)
-    db.commit()
-    
+
+    user_email = await _user_email_or_404(db, user_id)
+
+    # Sessions and permission assignments go with the row via ON DELETE CASCADE
+    await db.execute(delete(User).where(User.id == user_id))
+    await db.commit()
+
+    await invalidate_user_cache(user_email)
+
     return {"message": "User deleted successfully"}
 
 @router.get("/dashboard/stats")
 async def get_dashboard_stats(
-    current_user: User = Depends(require_role([UserRole.ADMIN])),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(require_role([UserRole.ADMIN])),
+    db: AsyncSession = Depends(get_db)
 ):
-    from sqlalchemy import func
-    
-    # Get statistics
-    total_users = db.query(User).count()
-    verified_users = db.query(User).filter(User.is_email_verified == True).count()
-    active_users = db.query(User).filter(User.is_active == True).count()
-    
-    # Count by role
-    role_counts = {}
-    for role in UserRole:
-        count = db.query(User).filter(User.role == role.value).count()
-        role_counts[role.value] = count
-    
-    # Recent registrations (last 7 days)
     seven_days_ago = datetime.utcnow() - timedelta(days=7)
-    recent_registrations = db.query(User).filter(
-        User.created_at >= seven_days_ago
-    ).count()
-    
+
+    # One conditional aggregation instead of a COUNT(*) per statistic
+    totals = (await db.execute(
+        select(
+            func.count(User.id),
+            func.sum(case((User.is_email_verified == True, 1), else_=0)),
+            func.sum(case((User.is_active == True, 1), else_=0)),
+            func.sum(case((User.created_at >= seven_days_ago, 1), else_=0))
+        )
+    )).one()
+    total_users, verified_users, active_users, recent_registrations = (
+        int(value or 0) for value in totals
+    )
+
+    # Role histogram in a single GROUP BY, defaulting missing roles to 0
+    role_counts = {role.value: 0 for role in UserRole}
+    role_rows = (await db.execute(
+        select(User.role, func.count(User.id)).group_by(User.role)
+    )).all()
+    for role, count in role_rows:
+        role_counts[role.value] = count
+
     return {
         "total_users": total_users,
         "verified_users": verified_users,
@@ -205,8 +275,17 @@ async def get_dashboard_stats(
 
 @router.get("/permissions", response_model=List[PermissionResponse])
 async def get_all_permissions(
-    current_user: User = Depends(require_role([UserRole.ADMIN])),
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    current_user: AuthenticatedUser = Depends(require_role([UserRole.ADMIN])),
+    db: AsyncSession = Depends(get_db)
 ):
-    permissions = db.query(Permission).all()
+    # The permission list is essentially static; let repeat pollers skip
+    # the SELECT and serialization entirely
+    etag = f'W/"{_PERMISSIONS_VERSION}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    permissions = (await db.execute(select(Permission))).scalars().all()
+    response.headers["ETag"] = etag
     return permissions
@@ -1,170 +1,206 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Body, Request
+from fastapi import APIRouter, BackgroundTasks, HTTPException, status, Depends, Body, Request
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from anyio import to_thread
 from datetime import datetime, timedelta
+import hmac
+import logging
 
+from app.config import settings
 from app.database import get_db
 from app.models.database_models import User, UserSession, Permission
-from app.models.schemas import UserCreate, UserLogin, UserResponse, Token, EmailRequest, PasswordReset
+from app.models.schemas import UserCreate, UserLogin, UserResponse, Token, EmailRequest, PasswordReset, permission_mask
 from app.auth.security import (
-    get_password_hash, 
-    verify_password, 
-    create_access_token, 
+    aget_password_hash,
+    averify_password,
+    create_access_token,
     create_refresh_token,
     generate_verification_token,
     hash_token,
     decode_token
 )
-from app.auth.dependencies import get_current_user
+from app.auth.dependencies import AuthenticatedUser, get_current_user, oauth2_scheme, revoke_token_cache
+from app.auth.permissions import ensure_default_permissions, permission_ids, role_permission_ids
 from app.utils.email import send_verification_email, send_password_reset_email
+from app.utils.rate_limit import rate_limiter
 from app.firebase_config import create_firebase_user, verify_firebase_token
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
-def init_default_permissions(db: Session):
-    """Initialize default permissions if they don't exist"""
-    default_permissions = [
-        {"name": "read", "description": "Can read data"},
-        {"name": "write", "description": "Can write data"},
-        {"name": "delete", "description": "Can delete data"},
-        {"name": "manage_users", "description": "Can manage users"},
-        {"name": "manage_roles", "description": "Can manage roles"}
-    ]
-    
-    for perm_data in default_permissions:
-        perm = db.query(Permission).filter(Permission.name == perm_data["name"]).first()
-        if not perm:
-            perm = Permission(**perm_data)
-            db.add(perm)
-    
-    db.commit()
+# Refresh-session expiry computed by MySQL, so the rows are stamped and
+# later compared against the same clock
+_SESSION_EXPIRY_SQL = text(f"NOW() + INTERVAL {settings.REFRESH_TOKEN_EXPIRE_DAYS} DAY")
+
+async def _send_verification_email_task(email: str, name: str, token: str):
+    # Runs after the response; failures must not surface to the client
+    try:
+        await send_verification_email(email, name, token)
+        logger.info("Verification email sent to %s", email)
+    except Exception:
+        logger.warning(
+            "Could not send verification email to %s; user can still log in "
+            "but email verification is unavailable", email, exc_info=True
+        )
+
+async def _send_password_reset_email_task(email: str, name: str, token: str):
+    try:
+        await send_password_reset_email(email, name, token)
+        logger.info("Password reset email sent to %s", email)
+    except Exception:
+        logger.warning("Could not send password reset email to %s", email, exc_info=True)
 
 @router.post("/signup", response_model=Token, status_code=status.HTTP_201_CREATED)
-async def signup(user_data: UserCreate, db: Session = Depends(get_db)):
-    # Initialize permissions
-    init_default_permissions(db)
-    
+async def signup(
+    user_data: UserCreate,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db)
+):
+    # Permissions are seeded at startup; recover here only if that failed
+    if not permission_ids:
+        await ensure_default_permissions()
+
     # Check if user exists
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+    existing_user = (await db.execute(
+        select(User).where(User.email == user_data.email)
+    )).scalar_one_or_none()
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
-    
+
     # Generate verification token
     verification_token = generate_verification_token()
-    
+
     # Create user
     user = User(
         email=user_data.email,
         name=user_data.name,
         phone=user_data.phone,
         role=user_data.role,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=await aget_password_hash(user_data.password),
         email_verification_token=hash_token(verification_token),
+        email_verification_token_prefix=hash_token(verification_token)[:16],
         email_verification_expire=datetime.utcnow() + timedelta(hours=24)
     )
-    
-    # Add default permissions based on role
-    if user.role == "admin":
-        permissions = db.query(Permission).all()
-        user.permissions = permissions
-    elif user.role == "hr":
-        permissions = db.query(Permission).filter(
-            Permission.name.in_(["read", "write", "manage_users"])
-        ).all()
-        user.permissions = permissions
-    else:
-        permission = db.query(Permission).filter(Permission.name == "read").first()
-        if permission:
-            user.permissions = [permission]
-    
-    # Create Firebase user (optional)
-    firebase_uid = create_firebase_user(user_data.email, user_data.password, user_data.name)
+
+    # Add default permissions based on role: one primary-key IN query
+    # against the ids cached at startup. Always assign the collection —
+    # reading an uninitialized one after flush would lazy-load and raise
+    # under AsyncSession
+    user.permissions = []
+    default_ids = role_permission_ids(user.role)
+    if default_ids:
+        user.permissions = (await db.execute(
+            select(Permission).where(Permission.id.in_(default_ids))
+        )).scalars().all()
+
+    # Create Firebase user (optional); the Admin SDK call is a blocking
+    # HTTP round-trip, so keep it off the event loop
+    firebase_uid = await to_thread.run_sync(
+        create_firebase_user, user_data.email, user_data.password, user_data.name
+    )
     if firebase_uid:
         user.firebase_uid = firebase_uid
-    
+
     db.add(user)
-    db.commit()
-    db.refresh(user)
-    
-    # Send verification email (with error handling)
-    try:
-        await send_verification_email(user.email, user.name, verification_token)
-        print(f"✅ Verification email sent to {user.email}")
-    except Exception as e:
-        print(f"⚠️ Warning: Could not send verification email: {e}")
-        print("💡 User can still login, but email verification is disabled")
-    
+    # One flush populates user.id from the INSERT; no refresh round-trip
+    await db.flush()
+
     # Create tokens
     access_token = create_access_token(
-        data={"sub": user.email, "role": user.role, "user_id": user.id}
+        data={
+            "sub": user.email,
+            "role": user.role,
+            "user_id": user.id,
+            "perms": permission_mask(p.name for p in user.permissions)
+        }
     )
     refresh_token = create_refresh_token(
         data={"sub": user.email, "user_id": user.id}
     )
-    
-    # Store refresh token in session
+
+    # Store refresh token in session, committing once with the user
     session = UserSession(
         user_id=user.id,
-        refresh_token=refresh_token,
-        expires_at=datetime.utcnow() + timedelta(days=7)
+        refresh_token_hash=hash_token(refresh_token),
+        expires_at=_SESSION_EXPIRY_SQL
     )
     db.add(session)
-    db.commit()
-    
+    await db.commit()
+
+    # Send the verification email after the response goes out, so SMTP
+    # latency never shows up in signup times
+    background_tasks.add_task(
+        _send_verification_email_task, user.email, user.name, verification_token
+    )
+
     return {
         "access_token": access_token,
         "refresh_token": refresh_token,
         "token_type": "bearer"
     }
 
-@router.post("/login", response_model=Token)
+@router.post("/login", response_model=Token, dependencies=[Depends(rate_limiter(limit=5, window_seconds=60))])
 async def login(
     request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # Find user
-    user = db.query(User).filter(User.email == form_data.username).first()
-    
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = (await db.execute(
+        select(User).options(
+            selectinload(User.permissions)
+        ).where(User.email == form_data.username)
+    )).scalar_one_or_none()
+
+    # Firebase-only accounts have an empty hash: fail fast instead of
+    # burning a password verification on input that can never match
+    if not user or not user.hashed_password or not await averify_password(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
-    
+
     # Check if account is active
     if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Account is disabled"
         )
-    
-    # Update last login
-    user.last_login = datetime.utcnow()
-    db.commit()
-    
+
+    # Update last login (committed together with the session row below);
+    # func.now() is rendered as NOW() so no datetime crosses the wire
+    user.last_login = func.now()
+
     # Create tokens
     access_token = create_access_token(
-        data={"sub": user.email, "role": user.role, "user_id": user.id}
+        data={
+            "sub": user.email,
+            "role": user.role,
+            "user_id": user.id,
+            "perms": permission_mask(p.name for p in user.permissions)
+        }
     )
     refresh_token = create_refresh_token(
         data={"sub": user.email, "user_id": user.id}
     )
-    
+
     # Store refresh token in session
     session = UserSession(
         user_id=user.id,
-        refresh_token=refresh_token,
-        expires_at=datetime.utcnow() + timedelta(days=7),
+        refresh_token_hash=hash_token(refresh_token),
+        expires_at=_SESSION_EXPIRY_SQL,
         ip_address=request.client.host if request.client else None,
         user_agent=request.headers.get("User-Agent")
     )
     db.add(session)
-    db.commit()
-    
+    await db.commit()
+
     return {
         "access_token": access_token,
         "refresh_token": refresh_token,
@@ -174,23 +210,28 @@ async def login(
 @router.post("/firebase-login", response_model=Token)
 async def firebase_login(
     id_token: str = Body(..., embed=True),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     try:
-        # Verify Firebase token
-        decoded_token = verify_firebase_token(id_token)
+        # Verify Firebase token in a worker thread: verification can block
+        # on Google's public-key refresh
+        decoded_token = await to_thread.run_sync(verify_firebase_token, id_token)
         email = decoded_token.get("email")
         firebase_uid = decoded_token.get("uid")
-        
+
         if not email:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email not found in Firebase token"
             )
-        
+
         # Find or create user
-        user = db.query(User).filter(User.email == email).first()
-        
+        user = (await db.execute(
+            select(User).options(
+                selectinload(User.permissions)
+            ).where(User.email == email)
+        )).scalar_one_or_none()
+
         if not user:
             # Create new user from Firebase
             user = User(
@@ -202,42 +243,55 @@ async def firebase_login(
                 is_email_verified=True,  # Firebase users are verified
                 hashed_password=""  # No password for Firebase users
             )
+            # Assign the role's default permissions, as signup does; this
+            # also initializes the collection, which must not be left to
+            # lazy-load when the perms claim is built below
+            user.permissions = []
+            default_ids = role_permission_ids(user.role)
+            if default_ids:
+                user.permissions = (await db.execute(
+                    select(Permission).where(Permission.id.in_(default_ids))
+                )).scalars().all()
+
             db.add(user)
-            db.commit()
-            db.refresh(user)
+            # Flush populates user.id; everything commits together below
+            await db.flush()
         else:
             # Update Firebase UID if not set
             if not user.firebase_uid:
                 user.firebase_uid = firebase_uid
-                db.commit()
-        
+
         # Update last login
-        user.last_login = datetime.utcnow()
-        db.commit()
-        
+        user.last_login = func.now()
+
         # Create tokens
         access_token = create_access_token(
-            data={"sub": email, "role": user.role, "user_id": user.id}
+            data={
+                "sub": email,
+                "role": user.role,
+                "user_id": user.id,
+                "perms": permission_mask(p.name for p in user.permissions)
+            }
         )
         refresh_token = create_refresh_token(
             data={"sub": email, "user_id": user.id}
         )
-        
+
         # Store refresh token
         session = UserSession(
             user_id=user.id,
-            refresh_token=refresh_token,
-            expires_at=datetime.utcnow() + timedelta(days=7)
+            refresh_token_hash=hash_token(refresh_token),
+            expires_at=_SESSION_EXPIRY_SQL
         )
         db.add(session)
-        db.commit()
-        
+        await db.commit()
+
         return {
             "access_token": access_token,
             "refresh_token": refresh_token,
             "token_type": "bearer"
         }
-        
+
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -245,121 +299,150 @@ async def firebase_login(
         )
 
 @router.get("/verify-email/{token}")
-async def verify_email(token: str, db: Session = Depends(get_db)):
+async def verify_email(token: str, db: AsyncSession = Depends(get_db)):
     hashed_token = hash_token(token)
-    
-    # Find user with token
-    user = db.query(User).filter(
-        User.email_verification_token == hashed_token,
-        User.email_verification_expire > datetime.utcnow()
-    ).first()
-    
+
+    # Prefilter on the short indexed prefix, then compare the full hash in
+    # constant time; a prefix collision just adds one candidate row
+    candidates = (await db.execute(
+        select(User).where(
+            User.email_verification_token_prefix == hashed_token[:16],
+            User.email_verification_expire > datetime.utcnow()
+        )
+    )).scalars().all()
+    user = next(
+        (u for u in candidates
+         if u.email_verification_token
+         and hmac.compare_digest(u.email_verification_token, hashed_token)),
+        None
+    )
+
     if not user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid or expired verification token"
         )
-    
+
     # Update user
     user.is_email_verified = True
     user.email_verification_token = None
+    user.email_verification_token_prefix = None
     user.email_verification_expire = None
-    db.commit()
-    
+    await db.commit()
+
     return {"message": "Email verified successfully"}
 
-@router.post("/forgot-password")
+@router.post("/forgot-password", dependencies=[Depends(rate_limiter(limit=5, window_seconds=60))])
 async def forgot_password(
     email_request: EmailRequest,
-    db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db)
 ):
     # Find user
-    user = db.query(User).filter(User.email == email_request.email).first()
-    
+    user = (await db.execute(
+        select(User).where(User.email == email_request.email)
+    )).scalar_one_or_none()
+
     if not user:
         # Don't reveal if email exists
         return {"message": "If the email exists, a reset link has been sent"}
-    
+
     # Generate reset token
     reset_token = generate_verification_token()
-    
+
     # Update user with reset token
     user.reset_password_token = hash_token(reset_token)
+    user.reset_password_token_prefix = hash_token(reset_token)[:16]
     user.reset_password_expire = datetime.utcnow() + timedelta(hours=1)
-    db.commit()
-    
-    # Send reset email (with error handling)
-    try:
-        await send_password_reset_email(user.email, user.name, reset_token)
-        print(f"✅ Password reset email sent to {user.email}")
-    except Exception as e:
-        print(f"⚠️ Warning: Could not send password reset email: {e}")
-        print("💡 Password reset email functionality is disabled")
-    
+    await db.commit()
+
+    # Send the reset email after the response goes out
+    background_tasks.add_task(
+        _send_password_reset_email_task, user.email, user.name, reset_token
+    )
+
     return {"message": "If the email exists, a reset link has been sent"}
 
 @router.post("/reset-password")
 async def reset_password(
     password_reset: PasswordReset,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     hashed_token = hash_token(password_reset.token)
-    
-    # Find user with token
-    user = db.query(User).filter(
-        User.reset_password_token == hashed_token,
-        User.reset_password_expire > datetime.utcnow()
-    ).first()
-    
+
+    # Prefilter on the indexed prefix, full-hash compare in constant time
+    candidates = (await db.execute(
+        select(User).where(
+            User.reset_password_token_prefix == hashed_token[:16],
+            User.reset_password_expire > datetime.utcnow()
+        )
+    )).scalars().all()
+    user = next(
+        (u for u in candidates
+         if u.reset_password_token
+         and hmac.compare_digest(u.reset_password_token, hashed_token)),
+        None
+    )
+
     if not user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid or expired reset token"
         )
-    
+
     # Update password
-    user.hashed_password = get_password_hash(password_reset.new_password)
+    user.hashed_password = await aget_password_hash(password_reset.new_password)
     user.reset_password_token = None
+    user.reset_password_token_prefix = None
     user.reset_password_expire = None
-    db.commit()
-    
+    await db.commit()
+
     return {"message": "Password reset successfully"}
 
 @router.post("/refresh", response_model=Token)
 async def refresh_token(
     refresh_token: str = Body(..., embed=True),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     payload = decode_token(refresh_token)
-    
+
     if not payload or payload.get("type") != "refresh":
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid refresh token"
         )
-    
+
     user_id = payload.get("user_id")
-    
+
     # Verify refresh token exists in database
-    session = db.query(UserSession).filter(
-        UserSession.refresh_token == refresh_token,
-        UserSession.user_id == user_id,
-        UserSession.expires_at > datetime.utcnow()
-    ).first()
-    
+    session = (await db.execute(
+        select(UserSession).options(
+            selectinload(UserSession.user).selectinload(User.permissions)
+        ).where(
+            UserSession.refresh_token_hash == hash_token(refresh_token),
+            UserSession.user_id == user_id,
+            UserSession.expires_at > func.now()
+        )
+    )).scalars().first()
+
     if not session:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired refresh token"
         )
-    
+
     user = session.user
-    
+
     # Create new access token
     access_token = create_access_token(
-        data={"sub": user.email, "role": user.role, "user_id": user.id}
+        data={
+            "sub": user.email,
+            "role": user.role,
+            "user_id": user.id,
+            "perms": permission_mask(p.name for p in user.permissions)
+        }
     )
-    
+
     return {
         "access_token": access_token,
         "token_type": "bearer"
@@ -367,11 +450,20 @@ async def refresh_token(
 
 @router.post("/logout")
 async def logout(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    token: str = Depends(oauth2_scheme),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    # Remove all user sessions
-    db.query(UserSession).filter(UserSession.user_id == current_user.id).delete()
-    db.commit()
-    
+    # Remove all user sessions; no session rows are loaded here, so skip
+    # the identity-map synchronization pass
+    await db.execute(
+        delete(UserSession)
+        .where(UserSession.user_id == current_user.id)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+    # Make sure the memoized access token is no longer served
+    revoke_token_cache(token)
+
     return {"message": "Successfully logged out"}
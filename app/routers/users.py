@@ -1,77 +1,89 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from datetime import datetime
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.cache import invalidate_user_cache
 from app.database import get_db
 from app.models.database_models import User
 from app.models.schemas import UserResponse, UserUpdate, PasswordChange
-from app.auth.dependencies import get_current_active_user
-from app.auth.security import get_password_hash, verify_password
+from app.auth.dependencies import AuthenticatedUser, get_current_active_user
+from app.auth.security import aget_password_hash, averify_password
 
 router = APIRouter()
 
-@router.get("/me", response_model=UserResponse)
+@router.get("/me", response_model=UserResponse, response_model_exclude_none=True)
 async def get_current_user_profile(
-    current_user: User = Depends(get_current_active_user)
+    current_user: AuthenticatedUser = Depends(get_current_active_user)
 ):
-    permissions = [p.name for p in current_user.permissions]
-    
-    return UserResponse(
-        id=current_user.id,
-        email=current_user.email,
-        name=current_user.name,
-        phone=current_user.phone,
-        role=current_user.role,
-        permissions=permissions,
-        is_active=current_user.is_active,
-        is_email_verified=current_user.is_email_verified,
-        created_at=current_user.created_at,
-        last_login=current_user.last_login
-    )
+    # UserResponse validates straight off the snapshot (from_attributes);
+    # building the model by hand here just meant validating twice
+    return current_user
 
 @router.put("/me")
 async def update_profile(
     user_update: UserUpdate,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
 ):
+    user = (await db.execute(
+        select(User).where(User.id == current_user.id)
+    )).scalar_one_or_none()
+
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+
     if user_update.name is not None:
-        current_user.name = user_update.name
+        user.name = user_update.name
     if user_update.phone is not None:
-        current_user.phone = user_update.phone
-    
-    current_user.updated_at = datetime.utcnow()
-    db.commit()
-    
+        user.phone = user_update.phone
+
+    await db.commit()
+
+    await invalidate_user_cache(user.email)
+
     return {"message": "Profile updated successfully"}
 
 @router.put("/change-password")
 async def change_password(
     password_data: PasswordChange,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
 ):
+    user = (await db.execute(
+        select(User).where(User.id == current_user.id)
+    )).scalar_one_or_none()
+
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+
     # Verify current password
-    if not verify_password(password_data.current_password, current_user.hashed_password):
+    if not await averify_password(password_data.current_password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
         )
-    
+
     # Update password
-    current_user.hashed_password = get_password_hash(password_data.new_password)
-    current_user.updated_at = datetime.utcnow()
-    db.commit()
-    
+    user.hashed_password = await aget_password_hash(password_data.new_password)
+    await db.commit()
+
     return {"message": "Password changed successfully"}
 
 @router.delete("/me")
 async def delete_account(
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: AuthenticatedUser = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    # Delete user (sessions will be cascade deleted)
-    db.delete(current_user)
-    db.commit()
-    
+    # Delete user (sessions and permissions cascade at the DB level)
+    await db.execute(delete(User).where(User.id == current_user.id))
+    await db.commit()
+
+    await invalidate_user_cache(current_user.email)
+
     return {"message": "Account deleted successfully"}
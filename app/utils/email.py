@@ -1,4 +1,6 @@
 from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from pathlib import Path
 import logging
 
 from app.config import settings
@@ -17,6 +19,19 @@ conf = ConnectionConfig(
     VALIDATE_CERTS=True
 )
 
+# One FastMail per process; building it per send re-validated the config
+# and tore down connection state on every email
+fm = FastMail(conf)
+
+# Email bodies live in app/templates/email; templates are parsed once at
+# import and only rendered per send
+_template_env = Environment(
+    loader=FileSystemLoader(Path(__file__).resolve().parent.parent / "templates" / "email"),
+    autoescape=select_autoescape(["html"])
+)
+_verify_email_template = _template_env.get_template("verify_email.html")
+_password_reset_template = _template_env.get_template("password_reset.html")
+
 async def send_email(email_to: str, subject: str, body: str):
     message = MessageSchema(
         subject=subject,
@@ -24,8 +39,7 @@ async def send_email(email_to: str, subject: str, body: str):
         body=body,
         subtype="html"
     )
-    
-    fm = FastMail(conf)
+
     try:
         await fm.send_message(message)
         logger.info(f"Email sent successfully to {email_to}")
@@ -35,39 +49,10 @@ async def send_email(email_to: str, subject: str, body: str):
 
 async def send_verification_email(email: str, name: str, token: str):
     verification_url = f"{settings.FRONTEND_URL}/verify-email?token={token}"
-    
-    body = f"""
-    <html>
-        <body>
-            <h2>Welcome {name}!</h2>
-            <p>Thank you for registering. Please verify your email address by clicking the link below:</p>
-            <a href="{verification_url}" style="display: inline-block; padding: 10px 20px; background-color: #4CAF50; color: white; text-decoration: none; border-radius: 5px;">
-                Verify Email
-            </a>
-            <p>Or copy this link: {verification_url}</p>
-            <p>This link will expire in 24 hours.</p>
-        </body>
-    </html>
-    """
-    
+    body = _verify_email_template.render(name=name, verification_url=verification_url)
     await send_email(email, "Verify Your Email", body)
 
 async def send_password_reset_email(email: str, name: str, token: str):
     reset_url = f"{settings.FRONTEND_URL}/reset-password?token={token}"
-    
-    body = f"""
-    <html>
-        <body>
-            <h2>Hello {name},</h2>
-            <p>You requested to reset your password. Click the link below to proceed:</p>
-            <a href="{reset_url}" style="display: inline-block; padding: 10px 20px; background-color: #2196F3; color: white; text-decoration: none; border-radius: 5px;">
-                Reset Password
-            </a>
-            <p>Or copy this link: {reset_url}</p>
-            <p>This link will expire in 1 hour.</p>
-            <p>If you didn't request this, please ignore this email.</p>
-        </body>
-    </html>
-    """
-    
+    body = _password_reset_template.render(name=name, reset_url=reset_url)
     await send_email(email, "Password Reset Request", body)
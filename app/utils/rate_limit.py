@@ -0,0 +1,29 @@
+from cachetools import TTLCache
+from fastapi import HTTPException, Request, status
+from threading import Lock
+
+def rate_limiter(limit: int, window_seconds: int):
+    """Per-IP fixed-window rate limit dependency.
+
+    Counters live in a process-local TTLCache, so the limit applies per
+    worker; good enough to blunt credential-stuffing bursts without a
+    shared backend. The window starts at an IP's first request and the
+    counter object is mutated in place so the expiry doesn't reset.
+    """
+    counters: TTLCache = TTLCache(maxsize=100_000, ttl=window_seconds)
+    lock = Lock()
+
+    async def limiter(request: Request):
+        ip = request.client.host if request.client else "unknown"
+        with lock:
+            bucket = counters.get(ip)
+            if bucket is None:
+                counters[ip] = bucket = [0]
+            bucket[0] += 1
+            count = bucket[0]
+        if count > limit:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, please try again later"
+            )
+    return limiter
@@ -1,65 +1,74 @@
--- SQL script to create database and tables
--- This is optional as SQLAlchemy will create the tables automatically
-
-CREATE DATABASE IF NOT EXISTS auth_database;
-USE auth_database;
-
--- Users table
-CREATE TABLE IF NOT EXISTS users (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    email VARCHAR(255) UNIQUE NOT NULL,
-    name VARCHAR(255) NOT NULL,
-    phone VARCHAR(20),
-    hashed_password VARCHAR(255) NOT NULL,
-    role ENUM('user', 'admin', 'hr', 'candidate') DEFAULT 'user',
-    is_active BOOLEAN DEFAULT TRUE,
-    is_email_verified BOOLEAN DEFAULT FALSE,
-    firebase_uid VARCHAR(255) UNIQUE,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-    last_login TIMESTAMP NULL,
-    email_verification_token VARCHAR(255),
-    email_verification_expire TIMESTAMP NULL,
-    reset_password_token VARCHAR(255),
-    reset_password_expire TIMESTAMP NULL,
-    INDEX idx_email (email),
-    INDEX idx_firebase_uid (firebase_uid)
-);
-
--- Permissions table
-CREATE TABLE IF NOT EXISTS permissions (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    name VARCHAR(50) UNIQUE NOT NULL,
-    description VARCHAR(255)
-);
-
--- User permissions junction table
-CREATE TABLE IF NOT EXISTS user_permissions (
-    user_id INT,
-    permission_id INT,
-    PRIMARY KEY (user_id, permission_id),
-    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-    FOREIGN KEY (permission_id) REFERENCES permissions(id) ON DELETE CASCADE
-);
-
--- User sessions table
-CREATE TABLE IF NOT EXISTS user_sessions (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    user_id INT NOT NULL,
-    refresh_token TEXT NOT NULL,
-    expires_at TIMESTAMP NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    ip_address VARCHAR(45),
-    user_agent VARCHAR(255),
-    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-    INDEX idx_user_id (user_id)
-);
-
--- Insert default permissions
-INSERT INTO permissions (name, description) VALUES
-('read', 'Can read data'),
-('write', 'Can write data'),
-('delete', 'Can delete data'),
-('manage_users', 'Can manage users'),
-('manage_roles', 'Can manage roles')
-ON DUPLICATE KEY UPDATE description = VALUES(description);
+-- SQL script to create database and tables
+-- This is optional as SQLAlchemy will create the tables automatically
+
+CREATE DATABASE IF NOT EXISTS auth_database;
+USE auth_database;
+
+-- Users table
+CREATE TABLE IF NOT EXISTS users (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    email VARCHAR(255) UNIQUE NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    phone VARCHAR(20),
+    hashed_password VARCHAR(255) NOT NULL,
+    role ENUM('user', 'admin', 'hr', 'candidate') DEFAULT 'user',
+    is_active BOOLEAN DEFAULT TRUE,
+    is_email_verified BOOLEAN DEFAULT FALSE,
+    firebase_uid VARCHAR(255) UNIQUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    last_login TIMESTAMP NULL,
+    email_verification_token VARCHAR(255),
+    email_verification_token_prefix CHAR(16),
+    email_verification_expire TIMESTAMP NULL,
+    reset_password_token VARCHAR(255),
+    reset_password_token_prefix CHAR(16),
+    reset_password_expire TIMESTAMP NULL,
+    INDEX idx_email (email),
+    INDEX idx_firebase_uid (firebase_uid),
+    INDEX ix_users_role (role),
+    INDEX ix_users_active_verified (is_active, is_email_verified),
+    INDEX ix_users_created_at (created_at),
+    INDEX ix_users_email_verification_token_prefix (email_verification_token_prefix),
+    INDEX ix_users_reset_password_token_prefix (reset_password_token_prefix)
+);
+
+-- Permissions table
+CREATE TABLE IF NOT EXISTS permissions (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(50) UNIQUE NOT NULL,
+    description VARCHAR(255)
+);
+
+-- User permissions junction table
+CREATE TABLE IF NOT EXISTS user_permissions (
+    user_id INT,
+    permission_id INT,
+    PRIMARY KEY (user_id, permission_id),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (permission_id) REFERENCES permissions(id) ON DELETE CASCADE
+);
+
+-- User sessions table
+CREATE TABLE IF NOT EXISTS user_sessions (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    refresh_token_hash CHAR(64) NOT NULL,
+    expires_at TIMESTAMP NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    ip_address VARCHAR(45),
+    user_agent VARCHAR(255),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    UNIQUE INDEX ix_sessions_refresh_token_hash (refresh_token_hash),
+    INDEX idx_user_id (user_id),
+    INDEX ix_sessions_user_expires (user_id, expires_at)
+);
+
+-- Insert default permissions
+INSERT INTO permissions (name, description) VALUES
+('read', 'Can read data'),
+('write', 'Can write data'),
+('delete', 'Can delete data'),
+('manage_users', 'Can manage users'),
+('manage_roles', 'Can manage roles')
+ON DUPLICATE KEY UPDATE description = VALUES(description);
@@ -1,22 +1,33 @@
-#!/usr/bin/env python3
-"""
-Main entry point for the FastAPI Authentication System.
-This file should be used to run the application in development.
-"""
-import sys
-import os
-
-# Add the current directory to Python path
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-
-import uvicorn
-from app.main import app
-
-if __name__ == "__main__":
-    uvicorn.run(
-        "app.main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        reload_dirs=["app"]
-    )
+#!/usr/bin/env python3
+"""
+Main entry point for the FastAPI Authentication System.
+Runs the reload dev server by default; set ENV=prod for the
+multi-worker uvloop server (worker count via WEB_CONCURRENCY).
+"""
+import sys
+import os
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import uvicorn
+
+if __name__ == "__main__":
+    if os.getenv("ENV") == "prod":
+        uvicorn.run(
+            "app.main:app",
+            host="0.0.0.0",
+            port=8000,
+            workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count())),
+            loop="uvloop",
+            http="httptools",
+            reload=False
+        )
+    else:
+        uvicorn.run(
+            "app.main:app",
+            host="0.0.0.0",
+            port=8000,
+            reload=True,
+            reload_dirs=["app"]
+        )